@@ -3,22 +3,61 @@ Enhanced PostgreSQL FastAPI Server for Azure AI Agent Graph API
 Fixed Azure Database for PostgreSQL authentication
 """
 import os
-import psycopg2
-import json
-import sys
-from typing import Optional, Dict, Any, List
+import re
+import psycopg
+from psycopg.adapt import Loader
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+import orjson
+import sqlglot
+from cachetools import TTLCache
+from sqlglot import expressions as exp
+from collections.abc import AsyncIterator
+from contextlib import nullcontext
+from datetime import time, timedelta
+from functools import lru_cache
+from uuid import uuid4
+from typing import Any
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import uvicorn
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, TypeAdapter
+from starlette.background import BackgroundTask
+import asyncio
+import atexit
 import logging
+import queue
+from time import monotonic
+from logging.handlers import QueueHandler, QueueListener
 
-from dotenv import load_dotenv
-load_dotenv()
+try:
+    import asyncpg
+except ImportError:  # Only needed for /query_fast and query templates
+    asyncpg = None
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Load .env only when present; deployed environments set variables directly
+ENV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
+if os.path.exists(ENV_FILE):
+    from dotenv import load_dotenv
+    load_dotenv(ENV_FILE)
+
+# Configure logging; records are handed to a queue and written by a background
+# thread, so request handlers never block on log I/O
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'WARNING').upper()
+_log_queue = queue.SimpleQueue()
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+_log_listener = QueueListener(_log_queue, _log_handler)
+_queue_handler = QueueHandler(_log_queue)
+# Only merge args into the message here; the listener's handler adds the prefix
+_queue_handler.setFormatter(logging.Formatter("%(message)s"))
+logging.basicConfig(level=LOG_LEVEL, handlers=[_queue_handler])
+_log_listener.start()
+atexit.register(_log_listener.stop)
 logger = logging.getLogger(__name__)
+# sqlglot warns whenever it falls back to a generic command (SHOW, EXPLAIN, ...)
+logging.getLogger("sqlglot").setLevel(logging.ERROR)
 
 # Database connection configuration
 DB_CONFIG = {
@@ -27,166 +66,756 @@ DB_CONFIG = {
     'database': os.getenv('DB_NAME', 'postgres'),
     'user': os.getenv('DB_USER', 'TessaDBAdmin'),
     'password': os.getenv('DB_PASSWORD'),
-    'sslmode': 'require'  # Required for Azure Database for PostgreSQL
+    # Required for Azure Database for PostgreSQL; use 'disable' behind a local
+    # PgBouncer, which terminates TLS
+    'sslmode': os.getenv('DB_SSLMODE', 'require')
+}
+
+# Connection pool configuration
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', 2))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 20))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', '0') == '1'
+# Pool tasks that reset returned connections, so returns are not serialized
+DB_POOL_WORKERS = int(os.getenv('DB_POOL_WORKERS', DB_POOL_MAX))
+
+# Server-side prepared statement configuration
+DB_PREPARE_THRESHOLD = int(os.getenv('DB_PREPARE_THRESHOLD', 1))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', 500))
+# PgBouncer in transaction pooling mode cannot keep prepared statements,
+# so server-side preparation is skipped when connecting through it
+DB_PGBOUNCER = os.getenv('DB_PGBOUNCER', '0') == '1'
+
+# Session settings sent in the startup packet of each connection; empty values
+# are skipped. JIT compilation rarely pays off for short OLTP-style queries
+DB_SESSION_SETTINGS = {
+    'statement_timeout': os.getenv('DB_STATEMENT_TIMEOUT', '30s'),
+    'idle_in_transaction_session_timeout': os.getenv('DB_IDLE_IN_TRANSACTION_TIMEOUT', '60s'),
+    'jit': os.getenv('DB_JIT', 'off'),
 }
+# Session settings would leak between clients behind PgBouncer transaction
+# pooling, and it rejects unknown startup parameters; set them there with
+# connect_query instead
+_SESSION_SETTINGS = {} if DB_PGBOUNCER else {name: value for name, value in DB_SESSION_SETTINGS.items() if value}
+
+# Build connection string once; make_conninfo quotes values such as passwords
+# containing spaces or quotes
+CONNECTION_STRING = make_conninfo(
+    host=DB_CONFIG['host'],
+    port=DB_CONFIG['port'],
+    dbname=DB_CONFIG['database'],
+    user=DB_CONFIG['user'],
+    password=DB_CONFIG['password'],
+    sslmode=DB_CONFIG['sslmode'],
+    # Startup settings are the session defaults RESET ALL returns to; spaces
+    # in values are backslash-escaped for libpq
+    options=" ".join(
+        "-c {}={}".format(name, value.replace("\\", "\\\\").replace(" ", "\\ "))
+        for name, value in _SESSION_SETTINGS.items()
+    ) or None
+)
+# Connection string safe to log, masked once rather than per request
+_MASKED_DSN = make_conninfo(CONNECTION_STRING, password="****") if DB_CONFIG['password'] else CONNECTION_STRING
+
+# Parsed SQL statements cached by SQL text
+SQL_PARSE_CACHE_SIZE = int(os.getenv('SQL_PARSE_CACHE_SIZE', 4096))
+# Statements that modify data, including inside CTEs
+_WRITE_EXPRESSIONS = (exp.Insert, exp.Update, exp.Delete, exp.Merge)
+
+# Serialized SELECT results cached by SQL text for a few seconds; 0 disables.
+# Each worker process keeps its own cache
+RESULT_TTL = int(os.getenv('RESULT_TTL', 5))
+RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', 1024))
+RESULT_CACHE_MAX_BYTES = int(os.getenv('RESULT_CACHE_MAX_BYTES', 1024 * 1024))
+RESULT_CACHE: TTLCache | None = TTLCache(maxsize=RESULT_CACHE_SIZE, ttl=RESULT_TTL) if RESULT_TTL > 0 else None
+# Built-in functions whose result changes between calls, by sqlglot SQL name
+_VOLATILE_FUNCTIONS = frozenset({
+    "CURRENT_DATE", "CURRENT_TIME", "CURRENT_TIMESTAMP", "LOCALTIME", "LOCALTIMESTAMP",
+    "NOW", "CLOCK_TIMESTAMP", "STATEMENT_TIMESTAMP", "TRANSACTION_TIMESTAMP", "TIMEOFDAY",
+    "RAND", "RANDOM", "UUID", "GEN_RANDOM_UUID", "UUID_GENERATE_V4",
+    "NEXTVAL", "CURRVAL", "LASTVAL", "SETVAL", "TXID_CURRENT", "PG_SLEEP",
+})
+
+# Rows fetched per round trip when streaming from a server-side cursor
+STREAM_ITERSIZE = int(os.getenv('STREAM_ITERSIZE', 2000))
+
+# asyncpg pool for /query_fast; it opens connections on top of POOL, so size
+# both within the server's max_connections
+ENABLE_FAST_PATH = os.getenv('ENABLE_FAST_PATH', '0') == '1'
+FAST_POOL_MIN = int(os.getenv('FAST_POOL_MIN', 2))
+FAST_POOL_MAX = int(os.getenv('FAST_POOL_MAX', 20))
+# Seconds between attempts to create the asyncpg pool after a failure
+FAST_POOL_RETRY_INTERVAL = int(os.getenv('FAST_POOL_RETRY_INTERVAL', 10))
+
+# Canonical queries served from /t/{name}, loaded from a JSON object mapping
+# template names to SQL with $1, $2, ... parameters
+QUERY_TEMPLATES_FILE = os.getenv(
+    'QUERY_TEMPLATES_FILE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "query_templates.json")
+)
+_TEMPLATE_NAME = re.compile(r"^[A-Za-z0-9_-]+$")
+
+# Connection pools, created on startup
+POOL: AsyncConnectionPool | None = None
+FAST_POOL: "asyncpg.Pool | None" = None
+_fast_pool_lock = asyncio.Lock()
+_fast_pool_retry_at = 0.0
+_templates_retry_at = 0.0
+
+# Serializes timedelta as ISO 8601 durations (e.g. P1D), as pydantic did
+_TIMEDELTA_ADAPTER = TypeAdapter(timedelta)
+
+def _orjson_default(value: Any):
+    """Serialize values orjson does not handle natively"""
+    if isinstance(value, timedelta):
+        return _TIMEDELTA_ADAPTER.dump_python(value, mode="json")
+    if isinstance(value, bytes):
+        # Same hex format PostgreSQL uses for bytea
+        return "\\x" + value.hex()
+    if asyncpg is not None and isinstance(value, asyncpg.Range):
+        return range_to_str(value)
+    return str(value)
+
+def range_to_str(value: "asyncpg.Range") -> str:
+    """Format an asyncpg range the way psycopg's Range prints"""
+    if value.isempty:
+        return "empty"
+    lower = "" if value.lower is None else str(value.lower)
+    upper = "" if value.upper is None else str(value.upper)
+    return f"{'[' if value.lower_inc else '('}{lower}, {upper}{']' if value.upper_inc else ')'}"
+
+def dump_json(content: Any) -> bytes:
+    """Serialize content to JSON bytes with orjson"""
+    return orjson.dumps(content, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS)
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson"""
+
+    def render(self, content: Any) -> bytes:
+        return dump_json(content)
 
-# Build connection string
-CONNECTION_STRING = f"host={DB_CONFIG['host']} port={DB_CONFIG['port']} dbname={DB_CONFIG['database']} user={DB_CONFIG['user']} password={DB_CONFIG['password']} sslmode={DB_CONFIG['sslmode']}"
+class PooledStreamingResponse(StreamingResponse):
+    """Streaming response whose background task also runs when sending fails"""
+
+    async def __call__(self, scope, receive, send):
+        # StreamingResponse skips its background task when the client has
+        # disconnected, which would leak a pooled connection
+        background, self.background = self.background, None
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if background is not None:
+                await background()
 
 # Initialize FastAPI app
 app = FastAPI(
     title="PostgreSQL Database API",
     description="PostgreSQL database query API for Azure AI Agent",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Add CORS middleware only for browser clients; Azure AI Agent calls the API
+# server-to-server and does not need it
+if os.getenv("ENABLE_CORS", "0") == "1":
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=[origin.strip() for origin in os.getenv("CORS_ORIGINS", "").split(",") if origin.strip()],
+        allow_credentials=False,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
 
 # Pydantic models
 class QueryRequest(BaseModel):
     query: str
     fetch_results: bool = True
+    stream: bool = False
+    read_only: bool = False
+
+class BatchRequest(BaseModel):
+    queries: list[str]
+    read_only: bool = False
 
+# Response models document the API only; handlers return ORJSONResponse
+# directly so rows are never validated by pydantic
 class QueryResponse(BaseModel):
     success: bool
-    data: Optional[List[Dict[str, Any]]] = None
-    columns: Optional[List[str]] = None
+    data: Any = None
+    columns: list[str] | None = None
     row_count: int
     message: str
 
-def test_connection():
+class BatchResponse(BaseModel):
+    success: bool
+    results: list[QueryResponse] | None = None
+    message: str
+
+class NumericStrLoader(Loader):
+    """Load numeric values as the text the API returns for them"""
+
+    def load(self, data) -> str:
+        return bytes(data).decode()
+
+def timetz_to_iso(text: str) -> str:
+    """Normalize PostgreSQL timetz text to ISO 8601"""
+    return time.fromisoformat(text).isoformat()
+
+class TimetzStrLoader(Loader):
+    """Load timetz values as ISO 8601 text; orjson rejects time values with a tzinfo"""
+
+    def load(self, data) -> str:
+        return timetz_to_iso(bytes(data).decode())
+
+async def configure_connection(conn: psycopg.AsyncConnection):
+    """Configure each new pooled connection"""
+    conn.prepared_max = DB_STATEMENT_CACHE_SIZE
+    # Set when a request runs SQL that may change session state
+    conn.session_changed = False
+    # psycopg picks loaders per column from the result's type OIDs once per
+    # result; skipping Decimal avoids building one and re-stringifying it in
+    # orjson's fallback for every numeric cell
+    conn.adapters.register_loader("numeric", NumericStrLoader)
+    conn.adapters.register_loader("timetz", TimetzStrLoader)
+
+async def reset_connection(conn: psycopg.AsyncConnection):
+    """Restore session state when a connection returns to the pool"""
+    if conn.read_only:
+        await conn.set_read_only(False)
+    # Any request but a plain SELECT can change session state, even a read-only
+    # one through set_config(); RESET ALL returns to the startup settings, and
+    # prepared statements are kept. Behind PgBouncer it would undo connect_query
+    if conn.session_changed and not DB_PGBOUNCER:
+        conn.session_changed = False
+        # In autocommit the reset is a single simple query, with no BEGIN/COMMIT
+        await conn.set_autocommit(True)
+        try:
+            await conn.execute("RESET ALL; DISCARD TEMP; UNLISTEN *", prepare=False)
+        finally:
+            await conn.set_autocommit(False)
+
+def mark_session_changed(conn: psycopg.AsyncConnection, queries: list[str]):
+    """Flag the connection for a reset unless every query is a plain SELECT"""
+    if not all(is_cacheable(query) for query in queries):
+        conn.session_changed = True
+
+def error_result(message: str) -> dict[str, Any]:
+    """Build the response body for a failed query"""
+    return {
+        "success": False,
+        "data": None,
+        "columns": None,
+        "row_count": 0,
+        "message": message
+    }
+
+@lru_cache(maxsize=SQL_PARSE_CACHE_SIZE)
+def parse_sql(query: str) -> tuple[exp.Expression, ...]:
+    """Parse SQL into its statements, cached by SQL text"""
+    # sqlglot covers less syntax than PostgreSQL, so SQL it cannot parse or
+    # classify becomes a single generic command and is left to the server
+    try:
+        statements = tuple(stmt for stmt in sqlglot.parse(query, read="postgres") if stmt is not None)
+    except sqlglot.errors.SqlglotError:
+        return (exp.Command(this=query),)
+    # Bare expressions are how sqlglot misreads statements such as TABLE t or NOTIFY c
+    if any(isinstance(stmt, (exp.Condition, exp.Alias)) for stmt in statements):
+        return (exp.Command(this=query),)
+    return statements
+
+def is_read_only(statements: tuple[exp.Expression, ...]) -> bool:
+    """Whether every statement is a plain query that does not modify data"""
+    for stmt in statements:
+        if not isinstance(stmt, (exp.Query, exp.Values)):
+            return False
+        if stmt.args.get("into") or stmt.find(*_WRITE_EXPRESSIONS):
+            return False
+    return bool(statements)
+
+def returns_rows(statements: tuple[exp.Expression, ...]) -> bool | None:
+    """Whether the last statement returns rows, or None if it cannot be told"""
+    last = statements[-1]
+    if isinstance(last, (exp.Query, exp.Values)):
+        return not last.args.get("into")
+    if isinstance(last, _WRITE_EXPRESSIONS):
+        return bool(last.args.get("returning"))
+    if isinstance(last, exp.Command):
+        return None
+    return False
+
+def validate_query(query: str, read_only: bool = False) -> tuple[exp.Expression, ...] | dict[str, Any]:
+    """Parse a query for execution, or return an error result if it is rejected"""
+    statements = parse_sql(query)
+    # Reject empty SQL without a database round trip
+    if not statements:
+        return error_result("Invalid SQL: empty query")
+    # SQL sqlglot cannot classify is never treated as read-only
+    if read_only and not is_read_only(statements):
+        return error_result("Only read-only queries are allowed")
+    return statements
+
+@lru_cache(maxsize=SQL_PARSE_CACHE_SIZE)
+def is_cacheable(query: str) -> bool:
+    """Whether a query is a single read-only SELECT whose result can be reused"""
+    statements = parse_sql(query)
+    if len(statements) != 1 or not is_read_only(statements):
+        return False
+    stmt = statements[0]
+    if stmt.find(exp.Lock, exp.TableSample):
+        return False
+    for func in stmt.find_all(exp.Func):
+        # Functions sqlglot does not model (user-defined, pg_advisory_lock,
+        # set_config, ...) may be VOLATILE, PostgreSQL's default
+        if isinstance(func, exp.Anonymous) or func.sql_name().upper() in _VOLATILE_FUNCTIONS:
+            return False
+    return True
+
+async def test_connection():
     """Test database connection on startup"""
     try:
-        conn = psycopg2.connect(CONNECTION_STRING)
-        cursor = conn.cursor()
-        cursor.execute("SELECT version();")
-        version = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        logger.info(f"Database connection successful. PostgreSQL version: {version[0]}")
+        async with POOL.connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute("SELECT version();")
+                version = await cursor.fetchone()
+        logger.info("Database connection successful. PostgreSQL version: %s", version[0])
         return True
     except Exception as e:
-        logger.error(f"Database connection failed: {str(e)}")
+        logger.error("Database connection failed: %s", e)
         return False
 
-def execute_db_query(query: str, fetch_results: bool = True) -> Dict[str, Any]:
-    """Execute SQL query against PostgreSQL database with enhanced error handling"""
-    conn = None
-    cursor = None
-    
-    try:
-        logger.info(f"Executing query: {query[:100]}...")
+async def cursor_result(cursor: psycopg.AsyncCursor, fetch_results: bool) -> dict[str, Any]:
+    """Build the response body for an executed query"""
+    description = cursor.description if fetch_results else None
+    if description is not None:
+        columns = [desc.name for desc in description]
+        # Fetch all results, already built as dictionaries by the
+        # row factory; datetimes are serialized by orjson
+        data = await cursor.fetchall()
         
-        # Connect to database
-        conn = psycopg2.connect(CONNECTION_STRING)
-        cursor = conn.cursor()
-        
-        # Execute query
-        cursor.execute(query)
+        logger.info("Query successful. Returned %d rows.", len(data))
+        return {
+            "success": True,
+            "data": data,
+            "columns": columns,
+            "row_count": len(data),
+            "message": f"Query executed successfully. Found {len(data)} rows."
+        }
+    else:
+        # For INSERT, UPDATE, DELETE operations
+        row_count = cursor.rowcount if cursor.rowcount != -1 else 0
         
-        if fetch_results and cursor.description:
-            # Get column names
-            columns = [desc[0] for desc in cursor.description]
-            # Fetch all results
-            results = cursor.fetchall()
-            
-            # Convert results to list of dictionaries
-            data = []
-            for row in results:
-                row_dict = {}
-                for i, value in enumerate(row):
-                    if value is None:
-                        row_dict[columns[i]] = None
-                    elif hasattr(value, 'isoformat'):  # datetime objects
-                        row_dict[columns[i]] = value.isoformat()
-                    else:
-                        row_dict[columns[i]] = value
-                data.append(row_dict)
-            
-            logger.info(f"Query successful. Returned {len(results)} rows.")
-            return {
-                "success": True,
-                "data": data,
-                "columns": columns,
-                "row_count": len(results),
-                "message": f"Query executed successfully. Found {len(results)} rows."
-            }
-        else:
-            # For INSERT, UPDATE, DELETE operations
-            conn.commit()
-            row_count = cursor.rowcount if cursor.rowcount != -1 else 0
-            
-            logger.info(f"Query successful. {row_count} rows affected.")
-            return {
-                "success": True,
-                "data": None,
-                "columns": None,
-                "row_count": row_count,
-                "message": f"Query executed successfully. {row_count} rows affected."
-            }
-            
-    except psycopg2.OperationalError as e:
-        error_msg = f"Connection error: {str(e)}"
-        logger.error(error_msg)
-        if conn:
-            conn.rollback()
+        logger.info("Query successful. %d rows affected.", row_count)
         return {
-            "success": False,
+            "success": True,
             "data": None,
             "columns": None,
-            "row_count": 0,
-            "message": error_msg
+            "row_count": row_count,
+            "message": f"Query executed successfully. {row_count} rows affected."
         }
-    except psycopg2.Error as e:
-        error_msg = f"Database error: {str(e)}"
+
+def db_error_message(e: Exception) -> str:
+    """Describe a failed query for the response message"""
+    if isinstance(e, psycopg.OperationalError):
+        return f"Connection error: {str(e)}"
+    if isinstance(e, psycopg.Error):
+        return f"Database error: {str(e)}"
+    return f"Unexpected error: {str(e)}"
+
+def is_stale_plan(e: psycopg.Error, query: str) -> bool:
+    """Whether a query failed only because DDL invalidated its prepared statement"""
+    # Retrying is safe for a single statement, which did not run; earlier
+    # statements of a multi-statement query may have committed
+    statements = parse_sql(query)
+    return (
+        "cached plan must not change result type" in str(e)
+        and len(statements) == 1
+        and not isinstance(statements[0], exp.Command)
+    )
+
+async def execute_db_query(query: str, fetch_results: bool = True, read_only: bool = False) -> dict[str, Any]:
+    """Execute SQL query against PostgreSQL database with enhanced error handling"""
+    try:
+        logger.info("Executing query: %.100s...", query)
+        
+        # Check out a pooled connection; the pool commits on success, rolls
+        # back on error and discards broken connections when they are returned
+        async with POOL.connection() as conn:
+            mark_session_changed(conn, [query])
+            # The parser check is only a pre-filter; functions can still write,
+            # so let the server enforce read_only too
+            if read_only:
+                await conn.set_read_only(True)
+            async with conn.cursor(row_factory=dict_row) as cursor:
+                # Execute query
+                try:
+                    await cursor.execute(query)
+                except psycopg.errors.FeatureNotSupported as e:
+                    if not is_stale_plan(e, query):
+                        raise
+                    # Drop the prepared statements and run the query again in
+                    # a fresh transaction, as asyncpg does for /query_fast
+                    await conn.rollback()
+                    await conn.execute("DEALLOCATE ALL")
+                    await cursor.execute(query)
+                # psycopg3 selects the first result of a multi-statement query;
+                # report the last one, as psycopg2 did
+                while cursor.nextset():
+                    pass
+                return await cursor_result(cursor, fetch_results)
+            
+    except Exception as e:
+        error_msg = db_error_message(e)
         logger.error(error_msg)
-        if conn:
-            conn.rollback()
+        return error_result(error_msg)
+
+async def execute_db_batch(queries: list[str], fetch_results: list[bool], read_only: bool = False) -> dict[str, Any]:
+    """Execute several queries in one transaction and one network round trip"""
+    try:
+        logger.info("Executing batch of %d queries...", len(queries))
+        
+        async with POOL.connection() as conn:
+            mark_session_changed(conn, queries)
+            if read_only:
+                await conn.set_read_only(True)
+            # Pipeline mode sends every query before reading any result
+            cursors = []
+            async with conn.pipeline():
+                for query in queries:
+                    cursor = conn.cursor(row_factory=dict_row)
+                    await cursor.execute(query)
+                    cursors.append(cursor)
+            
+            results = []
+            for query, fetch, cursor in zip(queries, fetch_results, cursors):
+                results.append(await cursor_result(cursor, fetch))
+                await cursor.close()
+        
+        logger.info("Batch successful. Ran %d queries.", len(results))
         return {
-            "success": False,
-            "data": None,
-            "columns": None,
-            "row_count": 0,
-            "message": error_msg
+            "success": True,
+            "results": results,
+            "message": f"Batch executed successfully. Ran {len(results)} queries."
         }
     except Exception as e:
-        error_msg = f"Unexpected error: {str(e)}"
+        error_msg = db_error_message(e)
         logger.error(error_msg)
-        if conn:
-            conn.rollback()
         return {
             "success": False,
-            "data": None,
-            "columns": None,
-            "row_count": 0,
+            "results": None,
             "message": error_msg
         }
-    finally:
-        # Clean up connections
-        if cursor:
-            cursor.close()
+
+async def stream_db_query(query: str, read_only: bool = False) -> StreamingResponse | dict[str, Any]:
+    """Stream a SELECT's rows as NDJSON from a server-side cursor, or return an error result"""
+    conn = None
+    try:
+        logger.info("Streaming query: %.100s...", query)
+        
+        conn = await POOL.getconn()
+        mark_session_changed(conn, [query])
+        if read_only:
+            await conn.set_read_only(True)
+        # A named cursor is declared server-side, so only itersize rows are
+        # held in memory at a time
+        cursor = conn.cursor(name=f"c{uuid4().hex}", row_factory=dict_row)
+        cursor.itersize = STREAM_ITERSIZE
+        await cursor.execute(query)
+    except Exception as e:
+        error_msg = db_error_message(e)
+        logger.error(error_msg)
         if conn:
-            conn.close()
+            # The pool rolls back or discards the connection as needed
+            await POOL.putconn(conn)
+        return error_result(error_msg)
+    
+    async def rows() -> AsyncIterator[bytes]:
+        row_count = 0
+        try:
+            async for row in cursor:
+                row_count += 1
+                yield dump_json(row) + b"\n"
+            await cursor.close()
+            await conn.commit()
+            logger.info("Stream complete. Sent %d rows.", row_count)
+        except Exception as e:
+            logger.error("Stream failed after %d rows: %s", row_count, e)
+            raise
+    
+    # The connection is returned by the response rather than the generator,
+    # which never runs if the client disconnects before the first row
+    return PooledStreamingResponse(
+        rows(),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(POOL.putconn, conn)
+    )
+
+async def init_fast_connection(conn: "asyncpg.Connection"):
+    """Configure each new asyncpg connection"""
+    # Decode JSON columns like psycopg does instead of returning raw text
+    for name in ("json", "jsonb"):
+        await conn.set_type_codec(name, schema="pg_catalog", encoder=lambda v: orjson.dumps(v).decode(), decoder=orjson.loads)
+    # orjson cannot serialize time values with a tzinfo
+    await conn.set_type_codec("timetz", schema="pg_catalog", encoder=str, decoder=timetz_to_iso, format="text")
+    # Return numeric as the server's text, like NumericStrLoader, rather than
+    # a Decimal that may print in exponent form
+    await conn.set_type_codec("numeric", schema="pg_catalog", encoder=str, decoder=str, format="text")
+    # asyncpg's geometric types would otherwise be serialized by their repr
+    for name in ("point", "line", "lseg", "box", "path", "polygon", "circle"):
+        await conn.set_type_codec(name, schema="pg_catalog", encoder=str, decoder=str, format="text")
+
+async def reset_fast_connection(conn: "asyncpg.Connection"):
+    """Reset an asyncpg connection released to the pool"""
+    if not DB_PGBOUNCER:
+        await conn.reset()
+        return
+    # asyncpg's reset runs RESET ALL, which would undo connect_query on the
+    # PgBouncer server connection the psycopg pool shares
+    if conn.is_in_transaction():
+        await conn.execute("ROLLBACK")
+    await conn.execute("SELECT pg_advisory_unlock_all(); CLOSE ALL; UNLISTEN *")
+
+async def create_fast_pool() -> "asyncpg.Pool | None":
+    """Create the asyncpg pool behind /query_fast, or None if it is unavailable"""
+    if asyncpg is None:
+        logger.error("asyncpg is not installed; /query_fast and query templates are unavailable")
+        return None
+    try:
+        return await asyncpg.create_pool(
+            host=DB_CONFIG['host'],
+            port=int(DB_CONFIG['port']),
+            database=DB_CONFIG['database'],
+            user=DB_CONFIG['user'],
+            password=DB_CONFIG['password'],
+            ssl=DB_CONFIG['sslmode'],
+            min_size=FAST_POOL_MIN,
+            max_size=FAST_POOL_MAX,
+            # asyncpg's prepared statement LRU cannot be used through PgBouncer
+            statement_cache_size=0 if DB_PGBOUNCER else DB_STATEMENT_CACHE_SIZE,
+            # Sent in the startup packet, as for POOL
+            server_settings=_SESSION_SETTINGS or None,
+            init=init_fast_connection,
+            reset=reset_fast_connection,
+            # Fail fast so a retry from a request does not stall it
+            timeout=10
+        )
+    except Exception as e:
+        logger.error("Failed to create fast path pool: %s", e)
+        return None
+
+async def get_fast_pool() -> "asyncpg.Pool | None":
+    """Return the asyncpg pool, creating it if startup or an earlier retry could not"""
+    global FAST_POOL, _fast_pool_retry_at
+    if FAST_POOL is not None or not (ENABLE_FAST_PATH or TEMPLATES):
+        return FAST_POOL
+    async with _fast_pool_lock:
+        if FAST_POOL is None and monotonic() >= _fast_pool_retry_at:
+            FAST_POOL = await create_fast_pool()
+            if FAST_POOL is None:
+                _fast_pool_retry_at = monotonic() + FAST_POOL_RETRY_INTERVAL
+            elif TEMPLATES:
+                await prepare_templates()
+    return FAST_POOL
+
+def status_result(status: str) -> dict[str, Any]:
+    """Build the response body for an asyncpg command status"""
+    # Status is e.g. "INSERT 0 3" or "UPDATE 2"
+    last = status.rsplit(" ", 1)[-1]
+    row_count = int(last) if last.isdigit() else 0
+    logger.info("Query successful. %d rows affected.", row_count)
+    return {
+        "success": True,
+        "data": None,
+        "columns": None,
+        "row_count": row_count,
+        "message": f"Query executed successfully. {row_count} rows affected."
+    }
+
+async def execute_fast_query(query: str, fetch_results: bool | None, read_only: bool = False) -> dict[str, Any]:
+    """Execute SQL query through asyncpg, skipping psycopg row handling"""
+    try:
+        logger.info("Executing fast query: %.100s...", query)
+        
+        async with FAST_POOL.acquire() as conn:
+            # Let the server enforce read_only, as execute_db_query does
+            async with conn.transaction(readonly=True) if read_only else nullcontext():
+                if fetch_results is None:
+                    # sqlglot cannot tell whether the statement returns rows,
+                    # so prepare it and ask the server
+                    stmt = await conn.prepare(query)
+                    rows = await stmt.fetch()
+                    columns = [attr.name for attr in stmt.get_attributes()]
+                    status = None if columns else stmt.get_statusmsg()
+                elif fetch_results:
+                    # fetch() goes through asyncpg's per-connection statement LRU
+                    rows = await conn.fetch(query)
+                    if rows:
+                        columns = list(rows[0].keys())
+                    else:
+                        # Empty results carry no column names, so describe
+                        # the statement; only empty results pay this round trip
+                        stmt = await conn.prepare(query)
+                        columns = [attr.name for attr in stmt.get_attributes()]
+                    status = None
+                else:
+                    # Simple query protocol, so multiple statements are allowed
+                    status = await conn.execute(query)
+        
+        if status is None:
+            # Records convert to dicts in C
+            data = [dict(row) for row in rows]
+            logger.info("Query successful. Returned %d rows.", len(data))
+            return {
+                "success": True,
+                "data": data,
+                "columns": columns,
+                "row_count": len(data),
+                "message": f"Query executed successfully. Found {len(data)} rows."
+            }
+        return status_result(status)
+    except Exception as e:
+        if isinstance(e, (OSError, asyncpg.InterfaceError, asyncpg.PostgresConnectionError)):
+            error_msg = f"Connection error: {str(e)}"
+        elif isinstance(e, asyncpg.PostgresError):
+            error_msg = f"Database error: {str(e)}"
+        else:
+            error_msg = f"Unexpected error: {str(e)}"
+        logger.error(error_msg)
+        return error_result(error_msg)
+
+def load_templates(path: str) -> dict[str, dict[str, Any]]:
+    """Load query templates from a JSON file, if it exists"""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "rb") as f:
+        config = orjson.loads(f.read())
+    
+    templates = {}
+    for name, sql in config.items():
+        if not _TEMPLATE_NAME.match(name) or not isinstance(sql, str):
+            logger.error("Skipping invalid query template: %s", name)
+            continue
+        read_only = is_read_only(parse_sql(sql))
+        # columns and param_count are filled in when the template is prepared
+        templates[name] = {"sql": sql, "read_only": read_only, "columns": None, "param_count": None}
+    return templates
+
+TEMPLATES = load_templates(QUERY_TEMPLATES_FILE)
+
+async def prepare_templates():
+    """Prepare query templates not yet prepared to record their parameters and columns"""
+    global _templates_retry_at
+    pending = {name: template for name, template in TEMPLATES.items() if template["columns"] is None}
+    if not pending or monotonic() < _templates_retry_at:
+        return
+    # Templates that fail, e.g. because their table does not exist yet, are
+    # retried by a later request, at most once every FAST_POOL_RETRY_INTERVAL
+    _templates_retry_at = monotonic() + FAST_POOL_RETRY_INTERVAL
+    try:
+        async with FAST_POOL.acquire() as conn:
+            for name, template in pending.items():
+                try:
+                    stmt = await conn.prepare(template["sql"])
+                    template["param_count"] = len(stmt.get_parameters())
+                    template["columns"] = tuple(attr.name for attr in stmt.get_attributes())
+                except Exception as e:
+                    logger.error("Failed to prepare query template %s: %s", name, e)
+    except Exception as e:
+        logger.error("Failed to prepare query templates: %s", e)
+
+def make_template_handler(name: str, template: dict[str, Any]):
+    """Build the endpoint for one query template"""
+    sql = template["sql"]
+    
+    async def handler(request: Request):
+        # Columns and parameter count are resolved once, so each call only
+        # binds parameters and builds rows
+        pool = await get_fast_pool()
+        if pool is not None and template["columns"] is None:
+            await prepare_templates()
+        columns = template["columns"]
+        if pool is None or columns is None:
+            return ORJSONResponse(error_result(f"Query template {name} is not available"))
+        
+        try:
+            body = await request.body()
+            params = orjson.loads(body)["params"] if body else []
+        except (orjson.JSONDecodeError, KeyError, TypeError):
+            return ORJSONResponse(error_result('Request body must be {"params": [...]}'))
+        if not isinstance(params, list) or len(params) != template["param_count"]:
+            return ORJSONResponse(error_result(f"Query template {name} takes {template['param_count']} parameters"))
+        
+        try:
+            async with pool.acquire() as conn:
+                if columns:
+                    rows = await conn.fetch(sql, *params)
+                else:
+                    # Templates that return no rows report rows affected, as /query does
+                    status = await conn.execute(sql, *params)
+        except Exception as e:
+            error_msg = f"Database error: {str(e)}"
+            logger.error(error_msg)
+            return ORJSONResponse(error_result(error_msg))
+        if RESULT_CACHE is not None and not template["read_only"]:
+            # The template may have changed cached data
+            RESULT_CACHE.clear()
+        
+        if not columns:
+            return Response(dump_json(status_result(status)), media_type="application/json")
+        # asyncpg re-prepares the statement after a schema change, so rows
+        # carry their own column names; the prepared ones may be stale
+        data = [dict(row) for row in rows]
+        return Response(dump_json({
+            "success": True,
+            "data": data,
+            "columns": list(rows[0].keys()) if rows else columns,
+            "row_count": len(data),
+            "message": f"Query executed successfully. Found {len(data)} rows."
+        }), media_type="application/json")
+    
+    handler.__name__ = f"template_{name}"
+    handler.__doc__ = f"Execute the {name} query template"
+    return handler
 
 # Startup event
 @app.on_event("startup")
 async def startup_event():
     """Test database connection on startup"""
     logger.info("Starting up FastAPI server...")
-    logger.info(f"Database host: {DB_CONFIG['host']}")
-    logger.info(f"Database user: {DB_CONFIG['user']}")
+    logger.info("Database host: %s", DB_CONFIG['host'])
+    logger.info("Database user: %s", DB_CONFIG['user'])
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Connection string: %s", _MASKED_DSN)
     
-    if not test_connection():
+    global POOL
+    POOL = AsyncConnectionPool(
+        CONNECTION_STRING,
+        min_size=DB_POOL_MIN,
+        max_size=DB_POOL_MAX,
+        kwargs={"prepare_threshold": None if DB_PGBOUNCER else DB_PREPARE_THRESHOLD},
+        configure=configure_connection,
+        reset=reset_connection,
+        check=AsyncConnectionPool.check_connection if DB_POOL_PRE_PING else None,
+        num_workers=DB_POOL_WORKERS,
+        open=False
+    )
+    await POOL.open()
+    
+    if not await test_connection():
         logger.error("Failed to connect to database on startup!")
     else:
         logger.info("Database connection verified on startup")
+    
+    # Query templates are served through the asyncpg pool as well; if it
+    # cannot be created now, requests retry every FAST_POOL_RETRY_INTERVAL
+    await get_fast_pool()
+
+# Shutdown event
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close all pooled database connections"""
+    if POOL:
+        await POOL.close()
+    if FAST_POOL:
+        await FAST_POOL.close()
 
 # Health check endpoint with database test
 @app.get("/health")
@@ -194,12 +823,8 @@ async def health_check():
     """Enhanced health check with database connectivity"""
     try:
         # Test database connection
-        conn = psycopg2.connect(CONNECTION_STRING)
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1;")
-        cursor.fetchone()
-        cursor.close()
-        conn.close()
+        async with POOL.connection() as conn:
+            await conn.execute("SELECT 1;")
         
         return {
             "status": "healthy", 
@@ -228,24 +853,145 @@ async def debug_config():
     }
 
 # Main query endpoint
-@app.post("/query", response_model=QueryResponse)
+@app.post("/query", responses={200: {"model": QueryResponse}})
 async def execute_query(request: QueryRequest):
     """Execute SQL query against PostgreSQL database"""
     try:
-        result = execute_db_query(request.query, request.fetch_results)
+        statements = validate_query(request.query, request.read_only)
+        if isinstance(statements, dict):
+            return ORJSONResponse(statements)
+        
+        # Decide whether to fetch rows from the statement itself; fall back to
+        # the client's flag for commands sqlglot does not understand
+        fetch_results = returns_rows(statements)
+        if fetch_results is None:
+            fetch_results = request.fetch_results
+        
+        if request.stream:
+            if not fetch_results:
+                return ORJSONResponse(error_result("Only queries that return rows can be streamed"))
+            result = await stream_db_query(request.query, request.read_only)
+            if isinstance(result, dict):
+                return ORJSONResponse(result)
+            return result
+        
+        # Serve repeated idempotent SELECTs from the result cache
+        cacheable = RESULT_CACHE is not None and fetch_results and is_cacheable(request.query)
+        if cacheable:
+            body = RESULT_CACHE.get(request.query)
+            if body is not None:
+                return Response(body, media_type="application/json", headers={"X-Cache": "HIT"})
+        
+        result = await execute_db_query(request.query, fetch_results, request.read_only)
         
-        if not result["success"]:
-            # Return the error as a proper response instead of raising exception
-            return QueryResponse(**result)
+        if cacheable:
+            body = dump_json(result)
+            if result["success"] and len(body) <= RESULT_CACHE_MAX_BYTES:
+                RESULT_CACHE[request.query] = body
+            return Response(body, media_type="application/json", headers={"X-Cache": "MISS"})
+        if RESULT_CACHE is not None and not is_read_only(statements):
+            # The statement may have changed cached data
+            RESULT_CACHE.clear()
         
-        return QueryResponse(**result)
+        # Errors are returned as a proper response instead of raising exception.
+        # Returning the response directly skips re-validating and re-encoding
+        # every row; orjson serializes datetimes natively
+        return ORJSONResponse(result)
     except Exception as e:
-        logger.error(f"Unexpected error in execute_query: {str(e)}")
+        logger.error("Unexpected error in execute_query: %s", e)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+# Batch query endpoint
+@app.post("/query_batch", responses={200: {"model": BatchResponse}})
+async def execute_query_batch(request: BatchRequest):
+    """Execute several SQL queries in a single round trip"""
+    try:
+        if not request.queries:
+            return ORJSONResponse(error_result("No queries to execute"))
+        
+        fetch_results = []
+        for i, query in enumerate(request.queries):
+            statements = validate_query(query, request.read_only)
+            if isinstance(statements, dict):
+                statements["message"] = f"Query {i + 1}: {statements['message']}"
+                return ORJSONResponse(statements)
+            # Pipeline mode uses the extended protocol, one statement per query
+            if len(statements) > 1:
+                return ORJSONResponse(error_result(f"Query {i + 1}: only one statement per query is allowed"))
+            fetch = returns_rows(statements)
+            fetch_results.append(True if fetch is None else fetch)
+        
+        result = await execute_db_batch(request.queries, fetch_results, request.read_only)
+        if RESULT_CACHE is not None and not all(is_cacheable(query) for query in request.queries):
+            # The batch may have changed cached data
+            RESULT_CACHE.clear()
+        return ORJSONResponse(result)
+    except Exception as e:
+        logger.error("Unexpected error in execute_query_batch: %s", e)
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+# Fast query endpoint
+@app.post("/query_fast", responses={200: {"model": QueryResponse}})
+async def execute_query_fast(request: Request):
+    """Execute SQL query through asyncpg without pydantic request parsing"""
+    try:
+        if not ENABLE_FAST_PATH:
+            return ORJSONResponse(error_result("Fast path is disabled; set ENABLE_FAST_PATH=1"))
+        if await get_fast_pool() is None:
+            return ORJSONResponse(error_result("Fast path database pool is unavailable"))
+        
+        try:
+            body = orjson.loads(await request.body())
+            query = body["query"]
+            read_only = bool(body.get("read_only", False))
+        except (orjson.JSONDecodeError, KeyError, TypeError, AttributeError):
+            return ORJSONResponse(error_result('Request body must be {"query": "..."}'))
+        if not isinstance(query, str):
+            return ORJSONResponse(error_result("query must be a string"))
+        
+        statements = validate_query(query, read_only)
+        if isinstance(statements, dict):
+            return ORJSONResponse(statements)
+        # fetch() uses the extended protocol, which runs a single statement;
+        # multiple statements go through execute(), which returns no rows
+        fetch_results = returns_rows(statements)
+        if len(statements) > 1:
+            if fetch_results:
+                return ORJSONResponse(error_result("Multi-statement queries that return rows are not supported by /query_fast; use /query"))
+            fetch_results = False
+        
+        result = await execute_fast_query(query, fetch_results, read_only)
+        if RESULT_CACHE is not None and not is_read_only(statements):
+            # The statement may have changed cached data
+            RESULT_CACHE.clear()
+        return ORJSONResponse(result)
+    except Exception as e:
+        logger.error("Unexpected error in execute_query_fast: %s", e)
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+# Query template endpoints
+for _name, _template in TEMPLATES.items():
+    app.add_api_route(
+        f"/t/{_name}",
+        make_template_handler(_name, _template),
+        methods=["POST"],
+        responses={200: {"model": QueryResponse}}
+    )
+
 def main():
     """Main entry point for the FastAPI server"""
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    import uvicorn
+    # Each worker process opens its own pool, so keep
+    # WEB_CONCURRENCY * DB_POOL_MAX within the server's max_connections
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=int(os.getenv("WEB_CONCURRENCY", 4)),
+        loop="uvloop",
+        http="httptools",
+        log_level="warning"
+    )
 
 if __name__ == "__main__":
     main()
\ No newline at end of file